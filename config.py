@@ -21,25 +21,37 @@ DEFAULT_PORT = 5001
 HOSTNAME = ""
 
 # Socket.IO Configuration
+# "threading" runs on Werkzeug with no extra dependencies. "eventlet" or
+# "gevent" use cooperative green threads and a production WSGI server;
+# install the matching extra first (pip install ".[eventlet]" / ".[gevent]").
+ASYNC_MODE = "threading"
 PING_TIMEOUT = 60
 PING_INTERVAL = 25
 
 # File Paths
 UNUSED_PROMPTS_FILE = "unused_prompts.txt"
 USED_PROMPTS_FILE = "used_prompts.txt"
+PROMPT_FLUSH_INTERVAL = 5  # Seconds between background writes of used prompts
 
-# Player Colors - each player gets a unique hue with light and dark shades
-PLAYER_COLORS = [
-    {"light": "#FF6B6B", "dark": "#C92A2A"},  # Red
-    {"light": "#4DABF7", "dark": "#1864AB"},  # Blue
-    {"light": "#51CF66", "dark": "#046113"},  # Green
-    {"light": "#FFD43B", "dark": "#F08C00"},  # Yellow
-    {"light": "#FF9F40", "dark": "#E67700"},  # Orange
-    {"light": "#FF6BFF", "dark": "#C92AC9"},  # Magenta
-    {"light": "#FFA07A", "dark": "#ff4f00"},  # Orange theme
-    {"light": "#66D9E8", "dark": "#0B7285"},  # Cyan
-]
+# Player Colors - each player gets a unique hue with (light, dark) shades.
+# Only the index is sent to clients; keep the order in sync with
+# PLAYER_COLORS in static/index.html and drawful.py.
+PLAYER_COLORS = (
+    ("#FF6B6B", "#C92A2A"),  # Red
+    ("#4DABF7", "#1864AB"),  # Blue
+    ("#51CF66", "#046113"),  # Green
+    ("#FFD43B", "#F08C00"),  # Yellow
+    ("#FF9F40", "#E67700"),  # Orange
+    ("#FF6BFF", "#C92AC9"),  # Magenta
+    ("#FFA07A", "#ff4f00"),  # Orange theme
+    ("#66D9E8", "#0B7285"),  # Cyan
+)
 
 # Canvas Configuration
 CANVAS_UNDO_STACK_SIZE = 20
 FILL_TOLERANCE = 50
+
+# Submitted drawings are shrunk to fit this size and re-encoded as lossless
+# WebP (flat canvas colors compress far better lossless than lossy)
+DRAWING_MAX_SIZE = 1024
+DRAWING_WEBP_EFFORT = 80  # Lossless compression effort (0-100), passed to Pillow as quality
@@ -1,7 +1,9 @@
+import base64
 import logging
 import random
 import secrets
 import socket
+import struct
 import sys
 import threading
 import time
@@ -9,7 +11,7 @@ import warnings
 from io import BytesIO
 
 import qrcode
-from flask import Flask, render_template_string, request, send_file
+from flask import Flask, abort, request, send_file, send_from_directory
 from flask_socketio import SocketIO, emit
 
 # Suppress socket connection errors from logging
@@ -28,24 +30,44 @@ socketio = SocketIO(
 )
 HOSTNAME = "mac.lan"
 
-try:
-    LOCAL_IP = socket.gethostbyname(HOSTNAME)
-except Exception:
-    LOCAL_IP = "127.0.0.1"
+def detect_local_ip():
+    """Resolve this machine's LAN IP once at startup."""
+    try:
+        return socket.gethostbyname(HOSTNAME)
+    except Exception:
+        pass
+    
+    # Connecting a UDP socket sends no packets; it only makes the OS pick
+    # the interface it would route through.
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except Exception:
+        return "127.0.0.1"
+
+
+# Resolved once at startup; request handlers only read LOCAL_IP/GAME_URL
+LOCAL_IP = detect_local_ip()
 
 GAME_URL = f"http://{LOCAL_IP}:5001"
 # Timer state
 timer_state = {"active": False, "time_remaining": 60, "thread": None}
 guess_timer_state = {"active": False, "time_remaining": 20, "thread": None}
 
-# Player colors - each player gets a unique hue with light and dark shades
+# Player colors - each player gets a unique hue with light and dark shades.
+# Clients only receive color_index, so the order must match PLAYER_COLORS in
+# config.py and static/index.html.
 PLAYER_COLORS = [
     {"light": "#FF6B6B", "dark": "#C92A2A"},  # Red
     {"light": "#4DABF7", "dark": "#1864AB"},  # Blue
     {"light": "#51CF66", "dark": "#046113"},  # Green
     {"light": "#FFD43B", "dark": "#F08C00"},  # Yellow
-    {"light": "#FF6BFF", "dark": "#C92AC9"},  # Magenta
     {"light": "#FF9F40", "dark": "#E67700"},  # Orange
+    {"light": "#FF6BFF", "dark": "#C92AC9"},  # Magenta
     {"light": "#FFA07A", "dark": "#ff4f00"},  # Orange theme
     {"light": "#66D9E8", "dark": "#0B7285"},  # Cyan
 ]
@@ -91,7 +113,8 @@ PROMPT_BANK = load_prompts()
 game_state = {
     "phase": "lobby",  # lobby, drawing, guessing, voting, results, final
     "players": {},  # {session_id: {name, score, likes, ready, color_index, prompt}}
-    "drawings": [],  # [{player_id, prompt, image_data}]
+    "drawings": [],  # [{player_id, prompt, image_url}]
+    "drawing_images": {},  # {drawing_id: PNG bytes}, served by /drawing/<drawing_id>
     "guesses": {},  # {drawing_index: [{player_id, guess}]}
     "votes": {},  # {drawing_index: [{player_id, vote}]}
     "current_drawing_index": 0,
@@ -103,7 +126,16 @@ game_state = {
 
 @app.route("/")
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return send_from_directory(app.static_folder, "index.html", max_age=300)
+
+
+@app.route("/drawing/<drawing_id>")
+def drawing(drawing_id):
+    """Serve a submitted drawing by the ID handed out in image_url"""
+    image = game_state["drawing_images"].get(drawing_id)
+    if image is None:
+        abort(404)
+    return send_file(BytesIO(image), mimetype="image/png")
 
 
 @app.route("/qr_code")
@@ -112,7 +144,6 @@ def qr_code():
 
     # Use the globally-resolved GAME_URL
     url = GAME_URL
-    url = "http://192.168.86.37:5001/"
 
     # Generate QR code
     qr = qrcode.QRCode(version=1, box_size=10, border=4)
@@ -132,7 +163,8 @@ def timer_thread():
     """Background thread that manages the drawing timer"""
     while timer_state["active"]:
         if timer_state["time_remaining"] > 0:
-            socketio.emit("timer_tick", {"time": timer_state["time_remaining"]})
+            # Same 3-byte packet as server.py: phase 0 (drawing), seconds left
+            socketio.emit("timer_tick", struct.pack("<BH", 0, timer_state["time_remaining"]))
             time.sleep(1)
             timer_state["time_remaining"] -= 1
         else:
@@ -147,7 +179,7 @@ def guess_timer_thread():
     while guess_timer_state["active"]:
         if guess_timer_state["time_remaining"] > 0:
             socketio.emit(
-                "guess_timer_tick", {"time": guess_timer_state["time_remaining"]}
+                "timer_tick", struct.pack("<BH", 1, guess_timer_state["time_remaining"])
             )
             time.sleep(1)
             guess_timer_state["time_remaining"] -= 1
@@ -207,7 +239,7 @@ def handle_join(data):
 
             emit(
                 "joined",
-                {"player_id": player_id, "colors": PLAYER_COLORS[pdata["color_index"]]},
+                {"player_id": player_id, "color_index": pdata["color_index"]},
             )
 
             # Restore player to current game state if game is in progress
@@ -219,10 +251,9 @@ def handle_join(data):
                     has_submitted = any(
                         d["player_id"] == player_id for d in game_state["drawings"]
                     )
-                    if not has_submitted and player_id in game_state["players"]:
-                        prompt = game_state["players"][player_id].get(
-                            "prompt", "Draw something!"
-                        )
+                    pdata = game_state["players"].get(player_id)
+                    if not has_submitted and pdata:
+                        prompt = pdata.get("prompt", "Draw something!")
                         emit(
                             "your_turn_draw",
                             {"prompt": prompt, "round": game_state.get("round", 0)},
@@ -254,7 +285,7 @@ def handle_join(data):
                             emit(
                                 "your_turn_guess",
                                 {
-                                    "image": current_drawing["image"],
+                                    "image_url": current_drawing["image_url"],
                                     "drawing_index": current_idx,
                                 },
                             )
@@ -284,7 +315,7 @@ def handle_join(data):
                             emit(
                                 "your_turn_vote",
                                 {
-                                    "image": current_drawing["image"],
+                                    "image_url": current_drawing["image_url"],
                                     "options": options,
                                     "drawing_index": current_idx,
                                     "artist_id": artist_id,
@@ -303,7 +334,6 @@ def handle_join(data):
 
     # Assign a color to the player based on their order
     color_index = len(game_state["players"]) % len(PLAYER_COLORS)
-    player_colors = PLAYER_COLORS[color_index]
 
     game_state["players"][player_id] = {
         "name": name,
@@ -311,7 +341,7 @@ def handle_join(data):
         "likes": 0,
         "color_index": color_index,
     }
-    emit("joined", {"player_id": player_id, "colors": player_colors})
+    emit("joined", {"player_id": player_id, "color_index": color_index})
     socketio.emit("update_lobby", {"players": game_state["players"]})
 
 
@@ -321,6 +351,7 @@ def handle_start():
         game_state["phase"] = "drawing"
         game_state["round"] = 0
         game_state["drawings"] = []
+        game_state["drawing_images"] = {}
         game_state["current_drawing_index"] = 0
         game_state["current_drawer_index"] = 0
         game_state["player_order"] = list(game_state["players"].keys())
@@ -346,11 +377,18 @@ def handle_start():
 def handle_drawing(data):
     player_id = request.sid
     player_prompt = game_state["players"][player_id].get("prompt", "Unknown")
+    image = data["image"]
+    if isinstance(image, str):
+        # Older clients send a base64 data URL instead of the PNG bytes
+        image = base64.b64decode(image.partition(",")[2])
+    # Unguessable ID so the client can fetch the image from /drawing/<id>
+    drawing_id = secrets.token_urlsafe(8)
+    game_state["drawing_images"][drawing_id] = image
     game_state["drawings"].append(
         {
             "player_id": player_id,
             "prompt": player_prompt,
-            "image": data["image"],
+            "image_url": f"/drawing/{drawing_id}",
         }
     )
 
@@ -381,7 +419,7 @@ def start_guessing_for_current_drawing():
         if pid != current["player_id"]:
             socketio.emit(
                 "your_turn_guess",
-                {"image": current["image"], "drawing_index": current_idx},
+                {"image_url": current["image_url"], "drawing_index": current_idx},
                 room=pid,
             )
         else:
@@ -461,10 +499,11 @@ def start_voting_for_current_drawing():
 
     current = game_state["drawings"][current_idx]
     artist_id = current["player_id"]
-    options = [{"text": current["prompt"], "is_correct": True}]
 
+    # Build and shuffle the options once as (author_id, option) pairs
+    options = [(None, {"text": current["prompt"], "is_correct": True})]
     for guess in game_state["guesses"][current_idx]:
-        options.append({"text": guess["guess"], "is_correct": False})
+        options.append((guess["player_id"], {"text": guess["guess"], "is_correct": False}))
 
     random.shuffle(options)
 
@@ -473,20 +512,13 @@ def start_voting_for_current_drawing():
 
     # All players vote on this drawing
     for pid in game_state["players"].keys():
-        # Create options for this specific player (excluding their own guess)
-        player_options = [{"text": current["prompt"], "is_correct": True}]
-
-        for guess in game_state["guesses"][current_idx]:
-            # Don't show this player their own guess
-            if guess["player_id"] != pid:
-                player_options.append({"text": guess["guess"], "is_correct": False})
-
-        random.shuffle(player_options)
+        # Don't show this player their own guess
+        player_options = [option for author_id, option in options if author_id != pid]
 
         socketio.emit(
             "your_turn_vote",
             {
-                "image": current["image"],
+                "image_url": current["image_url"],
                 "options": player_options,
                 "drawing_index": current_idx,
                 "artist_id": artist_id,
@@ -526,20 +558,24 @@ def calculate_scores_for_current_drawing():
     idx = game_state["current_drawing_index"]
     drawing = game_state["drawings"][idx]
     real_prompt = drawing["prompt"]
+    players = game_state["players"]
 
     for v in game_state["votes"][idx]:
-        voter_id = v["player_id"]
+        voter = players.get(v["player_id"])
         voted_answer = v["vote"]
         likes = v.get("likes", [])
 
         # Correct guess
         if voted_answer == real_prompt:
-            game_state["players"][voter_id]["score"] += 1000
+            if voter:
+                voter["score"] += 1000
         else:
             # If they voted for a fake prompt, give points to the prompt author
             for g in game_state["guesses"][idx]:
                 if g["guess"] == voted_answer:
-                    game_state["players"][g["player_id"]]["score"] += 500
+                    author = players.get(g["player_id"])
+                    if author:
+                        author["score"] += 500
                     break
 
         # Like tracking (tracked separately from score)
@@ -547,7 +583,9 @@ def calculate_scores_for_current_drawing():
             # Find the author of each liked prompt
             for g in game_state["guesses"][idx]:
                 if g["guess"] == liked_text:
-                    game_state["players"][g["player_id"]]["likes"] += 1
+                    author = players.get(g["player_id"])
+                    if author:
+                        author["likes"] += 1
                     break
 
 
@@ -568,7 +606,7 @@ def show_current_scores():
             "likes": likes,
             "players": game_state["players"],
             "correct_answer": drawing["prompt"],
-            "drawing_image": drawing["image"],
+            "drawing_url": drawing["image_url"],
             "artist_id": drawing["player_id"],
             "guesses": game_state["guesses"].get(idx, []),
             "votes": game_state["votes"].get(idx, []),
@@ -634,6 +672,7 @@ def handle_next_round():
         game_state["round"] += 1
         game_state["phase"] = "drawing"
         game_state["drawings"] = []
+        game_state["drawing_images"] = {}
         game_state["current_drawing_index"] = 0
         game_state["current_drawer_index"] = 0
         game_state["player_order"] = list(game_state["players"].keys())
@@ -668,13 +707,14 @@ def handle_next_round():
 
 @socketio.on("add_time")
 def handle_add_time():
-    # Add time to the appropriate active timer
+    # Add time to the appropriate active timer; the timer thread broadcasts
+    # the new value on its next tick, so only acknowledge the clicker here
     if timer_state["active"]:
         timer_state["time_remaining"] += 30
-        socketio.emit("timer_tick", {"time": timer_state["time_remaining"]})
+        emit("timer_bumped", {"seconds": 30})
     elif guess_timer_state["active"]:
         guess_timer_state["time_remaining"] += 30
-        socketio.emit("guess_timer_tick", {"time": guess_timer_state["time_remaining"]})
+        emit("timer_bumped", {"seconds": 30})
 
 
 @socketio.on("play_again")
@@ -686,6 +726,7 @@ def handle_play_again():
     game_state["phase"] = "lobby"
 
     game_state["drawings"] = []
+    game_state["drawing_images"] = {}
     game_state["guesses"] = {}
     game_state["votes"] = {}
     game_state["round"] = 0
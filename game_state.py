@@ -2,10 +2,26 @@
 Game state management and core game logic.
 """
 import random
+import secrets
+from collections import defaultdict
 
 import config
 
 
+def new_drawings():
+    """
+    Create empty drawing storage.
+    
+    Drawings are stored as parallel lists indexed by drawing index so that
+    scoring and emit paths only touch the field they need. Image bytes live
+    in GameState.drawing_store, referenced by drawing ID.
+    
+    Returns:
+        dict: {"player_ids": [], "prompts": [], "prompts_lower": [], "ids": []}
+    """
+    return {"player_ids": [], "prompts": [], "prompts_lower": [], "ids": []}
+
+
 class GameState:
     """Manages the state of the game."""
     
@@ -15,15 +31,30 @@ class GameState:
     def reset(self):
         """Reset game to initial lobby state."""
         self.phase = "lobby"  # lobby, drawing, guessing, voting, results, final
-        self.players = {}  # {session_id: {name, emoji, score, likes, ready, color_index, prompt}}
-        self.drawings = []  # [{player_id, prompt, image_data}]
-        self.guesses = {}  # {drawing_index: [{player_id, guess}]}
-        self.votes = {}  # {drawing_index: [{player_id, vote}]}
+        self.players = {}  # {session_id: {name, emoji, score, likes, ready, color_index, player_index, prompt}}
+        self.player_ids_by_index = []  # [session_id or None], indexed by player_index
+        self._player_ids_snapshot = ()  # Tuple of session IDs, rebuilt on join/leave/reconnect
+        self._scores = {}  # {session_id: score} kept in step with players[...]["score"]
+        self.emoji_to_pid = {}  # {emoji: session_id} for O(1) emoji conflict checks
+        self.name_to_pid = {}  # {lowercased name: session_id} for O(1) reconnect lookups
+        self.players_version = 0  # Bumped on join/leave/reconnect so clients know when to refetch
+        self._players_meta = (-1, {})  # (players_version, {session_id: {name, emoji, color_index}})
+        self.drawings = new_drawings()  # {player_ids: [], prompts: [], prompts_lower: [], ids: []}
+        self.submitted_drawing_pids = set()  # Artists of this round's drawings, for O(1) checks
+        self.drawing_store = {}  # {drawing_id: (image bytes, mimetype)}
+        self.guesses = {}  # {drawing_index: [{player_index, guess}]}
+        self.votes = {}  # {drawing_index: [{player_index, vote, likes}]}
+        self.guessed_by = {}  # {drawing_index: {player_index}} mirrors guesses for O(1) checks
+        self.guess_texts = {}  # {drawing_index: {lowercased prompt and guesses}} for duplicate checks
+        self.voted_by = {}  # {drawing_index: {player_index}} mirrors votes for O(1) checks
         self.current_drawing_index = 0
+        self.current_drawing = None  # (index, artist_id, prompt, drawing_id) or None
         self.current_drawer_index = 0
         self.player_order = []  # List of player IDs in drawing order
         self.round = 0
         self.continue_ready = set()  # Track which players have clicked continue
+        self._vote_payloads = {}  # {drawing_index: your_turn_vote payload} built once per drawing
+        self._eligible_guessers = {}  # {drawing_index: [session_id]} everyone but the artist
     
     def add_player(self, session_id, name, emoji="😀"):
         """
@@ -53,15 +84,144 @@ class GameState:
             "likes": 0,
             "ready": False,
             "color_index": color_index,
+            "player_index": len(self.player_ids_by_index),
             "prompt": None,
         }
+        self.player_ids_by_index.append(session_id)
+        self._scores[session_id] = 0
+        self.emoji_to_pid[emoji] = session_id
+        self.name_to_pid[name.lower()] = session_id
+        self._player_ids_snapshot = tuple(self.players)
+        self.players_version += 1
         
         return self.players[session_id]
     
+    def reassign_player(self, old_session_id, new_session_id, emoji=None):
+        """
+        Move a reconnecting player's data to their new session ID.
+        
+        Guesses and votes are keyed by player_index, so they keep pointing
+        at the player after the move.
+        
+        Args:
+            old_session_id: Session ID the player was known by
+            new_session_id: Session ID of the reconnecting client
+            emoji: Emoji the player reconnected with, or None to keep theirs
+        
+        Returns:
+            dict: The player's data
+        """
+        pdata = self.players.pop(old_session_id)
+        self.players[new_session_id] = pdata
+        self.player_ids_by_index[pdata["player_index"]] = new_session_id
+        self._scores[new_session_id] = self._scores.pop(old_session_id, pdata["score"])
+        self.emoji_to_pid.pop(pdata["emoji"], None)
+        if emoji is not None:
+            pdata["emoji"] = emoji
+        self.emoji_to_pid[pdata["emoji"]] = new_session_id
+        self.name_to_pid[pdata["name"].lower()] = new_session_id
+        self._player_ids_snapshot = tuple(self.players)
+        self.players_version += 1
+        artist_ids = self.drawings["player_ids"]
+        if old_session_id in self.submitted_drawing_pids:
+            self.submitted_drawing_pids.discard(old_session_id)
+            self.submitted_drawing_pids.add(new_session_id)
+            for i, pid in enumerate(artist_ids):
+                if pid == old_session_id:
+                    artist_ids[i] = new_session_id
+        if self.current_drawing and self.current_drawing[1] == old_session_id:
+            self.select_drawing(self.current_drawing_index)
+        # Both caches hold session IDs, so rebuild them for the new one
+        self._eligible_guessers.clear()
+        self.clear_vote_payloads()
+        return pdata
+    
+    def player_ids(self):
+        """
+        Get the session IDs of all players in join order.
+        
+        Returns:
+            tuple: Snapshot rebuilt only when the player set changes
+        """
+        return self._player_ids_snapshot
+    
+    def scores(self):
+        """
+        Get every player's current score.
+        
+        Returns:
+            dict: {session_id: score}, maintained as scores change rather
+            than rebuilt; emit it as-is but do not mutate it
+        """
+        return self._scores
+    
+    def reset_scores(self):
+        """Zero every player's score and likes for a new game."""
+        for pid, pdata in self.players.items():
+            pdata["score"] = 0
+            pdata["likes"] = 0
+            self._scores[pid] = 0
+    
+    def public_player(self, session_id):
+        """
+        Get the fields of one player that every client may see.
+        
+        Prompts and other per-round state are left out so they are never
+        broadcast to the other players.
+        
+        Returns:
+            dict: {name, emoji, score, color_index}
+        """
+        p = self.players[session_id]
+        return {"name": p["name"], "emoji": p["emoji"], "score": p["score"], "color_index": p["color_index"]}
+    
+    def public_players(self):
+        """
+        Get the public view of every player.
+        
+        Returns:
+            dict: {session_id: {name, emoji, score, color_index}}
+        """
+        return {pid: self.public_player(pid) for pid in self.players}
+    
+    def players_meta(self):
+        """
+        Get the fields of every player that only change on join/leave/reconnect.
+        
+        Clients keep their own copy and refetch it when a payload carries a
+        different players_version, so per-drawing payloads can leave it out.
+        
+        Returns:
+            dict: {session_id: {name, emoji, color_index}}, rebuilt only when
+            players_version changes
+        """
+        version, meta = self._players_meta
+        if version != self.players_version:
+            meta = {
+                pid: {"name": p["name"], "emoji": p["emoji"], "color_index": p["color_index"]}
+                for pid, p in self.players.items()
+            }
+            self._players_meta = (self.players_version, meta)
+        return meta
+    
     def remove_player(self, session_id):
-        """Remove a player from the game."""
-        if session_id in self.players:
-            del self.players[session_id]
+        """
+        Remove a player from the game.
+        
+        Returns:
+            bool: True if session_id was a player, False for any other socket
+        """
+        pdata = self.players.pop(session_id, None)
+        if pdata:
+            self.player_ids_by_index[pdata["player_index"]] = None
+            self._scores.pop(session_id, None)
+            if self.emoji_to_pid.get(pdata["emoji"]) == session_id:
+                del self.emoji_to_pid[pdata["emoji"]]
+            if self.name_to_pid.get(pdata["name"].lower()) == session_id:
+                del self.name_to_pid[pdata["name"].lower()]
+            self._player_ids_snapshot = tuple(self.players)
+            self.players_version += 1
+            self._eligible_guessers.clear()
         
         # Remove from continue_ready set if present
         self.continue_ready.discard(session_id)
@@ -69,6 +229,8 @@ class GameState:
         # Remove from player_order if present
         if session_id in self.player_order:
             self.player_order.remove(session_id)
+        
+        return pdata is not None
     
     def can_start_game(self):
         """Check if game has enough players to start."""
@@ -77,20 +239,182 @@ class GameState:
     def start_new_round(self):
         """Initialize a new round."""
         self.round += 1
-        self.drawings = []
-        self.guesses = {}
-        self.votes = {}
+        self.clear_drawings()
         self.current_drawing_index = 0
         self.current_drawer_index = 0
         self.continue_ready = set()
         
         # Randomize player order for this round
-        self.player_order = list(self.players.keys())
+        self.player_order = list(self._player_ids_snapshot)
         random.shuffle(self.player_order)
     
+    def clear_drawings(self):
+        """Drop all drawings along with their guesses, votes and cached options."""
+        self.current_drawing = None
+        self.drawings = new_drawings()
+        self.submitted_drawing_pids = set()
+        self.drawing_store = {}
+        self.guesses = {}
+        self.votes = {}
+        self.guessed_by = {}
+        self.guess_texts = {}
+        self.voted_by = {}
+        self._eligible_guessers = {}
+        self.clear_vote_payloads()
+    
+    def add_drawing(self, player_id, prompt, image, mimetype="image/png"):
+        """
+        Store a submitted drawing.
+        
+        Args:
+            player_id: Session ID of the artist
+            prompt: Prompt the artist was drawing
+            image: Image bytes
+            mimetype: MIME type of the image bytes
+        
+        Returns:
+            int: Index of the new drawing
+        """
+        # Unguessable, never-reused ID so clients can cache /drawing/<id>
+        drawing_id = secrets.token_urlsafe(8)
+        self.drawing_store[drawing_id] = (image, mimetype)
+        
+        drawings = self.drawings
+        self.submitted_drawing_pids.add(player_id)
+        drawings["player_ids"].append(player_id)
+        drawings["prompts"].append(prompt)
+        drawings["prompts_lower"].append(prompt.lower())
+        drawings["ids"].append(drawing_id)
+        return len(drawings["player_ids"]) - 1
+    
+    def select_drawing(self, drawing_index):
+        """
+        Make a drawing current and cache its fields for the phase handlers.
+        
+        Args:
+            drawing_index: Index of the drawing to guess/vote on next
+        
+        Returns:
+            tuple: (index, artist_id, prompt, drawing_id), or None if there
+            is no drawing at that index
+        """
+        self.current_drawing_index = drawing_index
+        if drawing_index < self.drawing_count():
+            drawings = self.drawings
+            self.current_drawing = (
+                drawing_index,
+                drawings["player_ids"][drawing_index],
+                drawings["prompts"][drawing_index],
+                drawings["ids"][drawing_index],
+            )
+        else:
+            self.current_drawing = None
+        return self.current_drawing
+    
+    def advance_drawing(self):
+        """
+        Move on to the next drawing of the round.
+        
+        Returns:
+            tuple: The new current drawing, or None when the round is over
+        """
+        return self.select_drawing(self.current_drawing_index + 1)
+    
+    def drawing_count(self):
+        """Get the number of drawings submitted this round."""
+        return len(self.drawings["player_ids"])
+    
     def all_drawings_complete(self):
         """Check if all players have submitted drawings."""
-        return len(self.drawings) == len(self.players)
+        return self.drawing_count() == len(self.players)
+    
+    def open_guessing(self, drawing_index):
+        """
+        Prepare a drawing for guessing.
+        
+        The taken-text set is seeded with the real prompt so a single
+        lookup rejects both the prompt and earlier guesses.
+        """
+        self.guesses.setdefault(drawing_index, [])
+        self.guess_texts.setdefault(drawing_index, {self.drawings["prompts_lower"][drawing_index]})
+    
+    def is_guess_taken(self, drawing_index, guess):
+        """Check (case-insensitively) if a guess matches the prompt or an earlier guess."""
+        return guess.lower() in self.guess_texts.get(drawing_index, ())
+    
+    def add_guess(self, drawing_index, session_id, guess):
+        """
+        Record a player's guess for a drawing (once per player).
+        
+        Returns:
+            bool: True if the guess was recorded
+        """
+        pdata = self.players.get(session_id)
+        if pdata is None:
+            return False
+        player_index = pdata["player_index"]
+        guessed_by = self.guessed_by.setdefault(drawing_index, set())
+        if player_index in guessed_by:
+            return False
+        guessed_by.add(player_index)
+        self.guesses.setdefault(drawing_index, []).append({"player_index": player_index, "guess": guess})
+        if guess:
+            self.guess_texts.setdefault(drawing_index, set()).add(guess.lower())
+        return True
+    
+    def add_vote(self, drawing_index, session_id, vote, likes):
+        """
+        Record a player's vote and likes for a drawing (once per player).
+        
+        Returns:
+            bool: True if the vote was recorded
+        """
+        pdata = self.players.get(session_id)
+        if pdata is None:
+            return False
+        player_index = pdata["player_index"]
+        voted_by = self.voted_by.setdefault(drawing_index, set())
+        if player_index in voted_by:
+            return False
+        voted_by.add(player_index)
+        self.votes.setdefault(drawing_index, []).append({"player_index": player_index, "vote": vote, "likes": likes})
+        return True
+    
+    def guesses_for_client(self, drawing_index):
+        """Get a drawing's guesses with player indices mapped back to session IDs."""
+        ids = self.player_ids_by_index
+        return [
+            {"player_id": ids[g["player_index"]], "guess": g["guess"]}
+            for g in self.guesses.get(drawing_index, [])
+        ]
+    
+    def votes_for_client(self, drawing_index):
+        """Get a drawing's votes with player indices mapped back to session IDs."""
+        ids = self.player_ids_by_index
+        return [
+            {"player_id": ids[v["player_index"]], "vote": v["vote"], "likes": v["likes"]}
+            for v in self.votes.get(drawing_index, [])
+        ]
+    
+    def eligible_guessers(self, drawing_index):
+        """
+        Get the players who guess on a drawing (everyone but the artist).
+        
+        The list is built once per drawing and dropped whenever a player
+        leaves or reconnects, so callers must not mutate it.
+        
+        Args:
+            drawing_index: Index of the drawing being guessed
+        
+        Returns:
+            list: Session IDs of the guessers
+        """
+        eligible = self._eligible_guessers.get(drawing_index)
+        if eligible is None:
+            artist_id = self.drawings["player_ids"][drawing_index]
+            eligible = [pid for pid in self.players if pid != artist_id]
+            self._eligible_guessers[drawing_index] = eligible
+        return eligible
     
     def all_guesses_complete(self):
         """Check if all players (except artist) have guessed current drawing."""
@@ -99,7 +423,7 @@ class GameState:
             return False
         
         # Expected guesses = all players except the artist
-        expected_guesses = len(self.players) - 1
+        expected_guesses = len(self.eligible_guessers(current_idx))
         return len(self.guesses[current_idx]) == expected_guesses
     
     def all_votes_complete(self):
@@ -116,6 +440,55 @@ class GameState:
         """Check if all players have clicked continue."""
         return len(self.continue_ready) == len(self.players)
     
+    def drawing_url(self, drawing_index):
+        """Build the URL clients use to fetch a drawing."""
+        return f"/drawing/{self.drawings['ids'][drawing_index]}"
+    
+    def get_vote_payload(self, drawing_index):
+        """
+        Get the voting payload for a drawing, building it once.
+        
+        The options are shuffled exactly once, here, and every player is
+        sent that same order; clients hide their own guess instead of the
+        server building a list per player. Call only after guessing on the
+        drawing is over, since the options are taken from its guesses.
+        
+        Args:
+            drawing_index: Index of the drawing being voted on
+        
+        Returns:
+            dict: {drawing_id, image_url, options, artist_id}, where options
+            are the real prompt + non-empty guesses in shuffled order
+        """
+        payload = self._vote_payloads.get(drawing_index)
+        if payload is None:
+            artist_id = self.drawings["player_ids"][drawing_index]
+            options = [{
+                "text": self.drawings["prompts"][drawing_index],
+                "player_id": artist_id,
+                "is_correct": True
+            }]
+            for g in self.guesses.get(drawing_index, []):
+                if g["guess"]:  # Guesses are stripped on submit; skip empty ones
+                    options.append({
+                        "text": g["guess"],
+                        "player_id": self.player_ids_by_index[g["player_index"]],
+                        "is_correct": False
+                    })
+            random.shuffle(options)
+            payload = {
+                "drawing_id": self.drawings["ids"][drawing_index],
+                "image_url": self.drawing_url(drawing_index),
+                "options": options,
+                "artist_id": artist_id
+            }
+            self._vote_payloads[drawing_index] = payload
+        return payload
+    
+    def clear_vote_payloads(self):
+        """Drop cached voting payloads (call whenever drawings are reset)."""
+        self._vote_payloads.clear()
+    
     def get_player_scores(self):
         """
         Get sorted list of players by score.
@@ -137,85 +510,113 @@ class GameState:
             drawing_index: Index of the drawing to score
         
         Returns:
-            dict: Scoring information including correct answer and vote details
+            dict: Scoring information including correct answer, vote details
+            and the score/like changes ({session_id: points}) this drawing earned
         """
-        if drawing_index >= len(self.drawings):
+        if drawing_index >= self.drawing_count():
             return None
         
-        drawing = self.drawings[drawing_index]
-        correct_answer = drawing["prompt"]
-        artist_id = drawing["player_id"]
+        correct_answer = self.drawings["prompts"][drawing_index]
+        artist_id = self.drawings["player_ids"][drawing_index]
         
         # Get all guesses and votes for this drawing
+        ids = self.player_ids_by_index
         guesses = self.guesses.get(drawing_index, [])
         votes = self.votes.get(drawing_index, [])
         
+        # Index guess authors by text once so each like/vote is an O(1) lookup
+        # (first writer wins, matching the original scan order)
+        guess_author_by_text = {}
+        guess_author_by_lower = {}
+        for guess_data in guesses:
+            text = guess_data["guess"]
+            if text:
+                author_id = ids[guess_data["player_index"]]
+                guess_author_by_text.setdefault(text, author_id)
+                guess_author_by_lower.setdefault(text.lower(), author_id)
+        correct_lower = self.drawings["prompts_lower"][drawing_index]
+        
+        # Accumulate score/like changes locally and apply them once at the end
+        score_delta = defaultdict(int)
+        likes_delta = defaultdict(int)
+        
         # Track who voted for what
         vote_details = []
         
         # Award points for votes
         for vote_data in votes:
-            voter_id = vote_data["player_id"]
+            voter_id = ids[vote_data["player_index"]]
+            voter = self.players.get(voter_id)
+            voter_name = voter["name"] if voter else "Unknown"
             vote = vote_data.get("vote")
             likes = vote_data.get("likes", [])
             
             # Award likes
             for liked_guess in likes:
-                for guess_data in guesses:
-                    if guess_data["guess"] == liked_guess:
-                        liked_player_id = guess_data["player_id"]
-                        if liked_player_id in self.players:
-                            self.players[liked_player_id]["likes"] += 1
+                liked_player_id = guess_author_by_text.get(liked_guess)
+                if liked_player_id is not None:
+                    likes_delta[liked_player_id] += 1
             
             # Skip vote processing if no vote (artist likes-only)
             if not vote:
                 continue
             
             # Check if vote is correct
-            if vote.lower() == correct_answer.lower():
+            if vote.lower() == correct_lower:
                 # Correct guess - voter gets 1000 points
-                if voter_id in self.players:
-                    self.players[voter_id]["score"] += 1000
+                score_delta[voter_id] += 1000
                 # Artist gets 500 points for each correct vote
-                if artist_id in self.players:
-                    self.players[artist_id]["score"] += 500
+                score_delta[artist_id] += 500
                 vote_details.append({
-                    "voter": self.players[voter_id]["name"] if voter_id in self.players else "Unknown",
+                    "voter": voter_name,
                     "vote": vote,
                     "correct": True
                 })
             else:
-                # Wrong guess - check if they voted for someone's fake answer
-                for guess_data in guesses:
-                    if guess_data["guess"] and guess_data["guess"].lower() == vote.lower():
-                        # Found the player who wrote this fake answer
-                        fake_answer_player_id = guess_data["player_id"]
-                        if fake_answer_player_id in self.players:
-                            # Fake answer writer gets 500 points
-                            self.players[fake_answer_player_id]["score"] += 500
-                        break
+                # Wrong guess - find the player who wrote this fake answer
+                fake_answer_player_id = guess_author_by_lower.get(vote.lower())
+                if fake_answer_player_id is not None:
+                    # Fake answer writer gets 500 points
+                    score_delta[fake_answer_player_id] += 500
                 
                 vote_details.append({
-                    "voter": self.players[voter_id]["name"] if voter_id in self.players else "Unknown",
+                    "voter": voter_name,
                     "vote": vote,
                     "correct": False
                 })
         
+        # Apply the accumulated changes to players who are still in the game
+        for pid in list(score_delta):
+            p = self.players.get(pid)
+            if p:
+                p["score"] += score_delta[pid]
+                self._scores[pid] = p["score"]
+            else:
+                del score_delta[pid]
+        for pid in list(likes_delta):
+            p = self.players.get(pid)
+            if p:
+                p["likes"] += likes_delta[pid]
+            else:
+                del likes_delta[pid]
+        
         # Create guess details (who wrote what)
-        guess_details = [
-            {
-                "player": self.players[g["player_id"]]["name"] if g["player_id"] in self.players else "Unknown",
+        guess_details = []
+        for g in guesses:
+            guesser = self.players.get(ids[g["player_index"]])
+            guess_details.append({
+                "player": guesser["name"] if guesser else "Unknown",
                 "guess": g["guess"]
-            }
-            for g in guesses
-        ]
+            })
         
+        artist = self.players.get(artist_id)
         return {
             "correct_answer": correct_answer,
-            "artist": self.players[artist_id]["name"] if artist_id in self.players else "Unknown",
+            "artist": artist["name"] if artist else "Unknown",
             "vote_details": vote_details,
             "guess_details": guess_details,
-            "drawing_image": drawing["image"]
+            "score_delta": dict(score_delta),
+            "likes_delta": dict(likes_delta)
         }
 
 
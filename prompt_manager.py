@@ -1,26 +1,38 @@
 """
 Prompt management for loading and rotating game prompts.
 """
+import functools
+import random
+import threading
+
 import config
 
 
+@functools.lru_cache(maxsize=4)
+def _read_prompts(filename):
+    """Read and parse a prompts file (cached until the next flush_prompts)."""
+    with open(filename, "r", encoding="utf-8") as f:
+        return tuple(line.strip() for line in f if line.strip())
+
+
 def load_prompts(filename=None):
     """
     Load prompts from a file.
     
+    The parsed file is cached, so repeated loads do not touch the disk
+    until flush_prompts() rewrites it.
+    
     Args:
         filename: Path to prompts file. Defaults to config.UNUSED_PROMPTS_FILE
     
     Returns:
-        List of prompt strings
+        List of prompt strings (a fresh copy the caller may modify)
     """
     if filename is None:
         filename = config.UNUSED_PROMPTS_FILE
     
     try:
-        with open(filename, "r", encoding="utf-8") as f:
-            prompts = [line.strip() for line in f if line.strip()]
-        return prompts
+        return list(_read_prompts(filename))
     except FileNotFoundError:
         print(f"Warning: {filename} not found. Creating empty file.")
         with open(filename, "w", encoding="utf-8") as f:
@@ -31,56 +43,92 @@ def load_prompts(filename=None):
         return []
 
 
-def move_prompt_to_used(prompt):
+# Prompts drawn since the last flush_prompts(), in draw order
+_pending_used = []
+# Lowercased copies of _pending_used, so queueing a prompt twice is a no-op
+_pending_lower = set()
+# Guards the prompt bank and pending queue shared with the flush task
+_lock = threading.Lock()
+# Serializes whole flushes so file writes land in queue order
+_flush_lock = threading.Lock()
+
+
+def _queue_used(prompt):
+    """Queue a used prompt (caller holds _lock)."""
+    key = prompt.lower()
+    if key not in _pending_lower:
+        _pending_lower.add(key)
+        _pending_used.append(prompt)
+
+
+def flush_prompts(prompt_bank):
     """
-    Move a prompt from unused_prompts.txt to used_prompts.txt.
-    Uses case-insensitive comparison.
+    Write all queued prompt moves to disk in one batch.
+    
+    Removes every used prompt from the bank (case-insensitive), rewrites
+    unused_prompts.txt from the bank once and appends the used prompts to
+    used_prompts.txt once.
+    
+    Safe to call from a background task: the in-memory bank stays the
+    source of truth and handlers only wait for the in-memory update, not
+    for the file writes.
     
     Args:
-        prompt: The prompt string to mark as used
+        prompt_bank: In-memory list of unused prompts (updated in place)
     """
-    try:
-        # Read all unused prompts
-        with open(config.UNUSED_PROMPTS_FILE, "r", encoding="utf-8") as f:
-            unused = [line.strip() for line in f if line.strip()]
-
-        # Remove the used prompt (case-insensitive)
-        original_count = len(unused)
-        unused = [p for p in unused if p.lower() != prompt.lower()]
+    with _flush_lock:
+        with _lock:
+            if not _pending_used:
+                return
+            
+            used = _pending_used[:]
+            del _pending_used[:]
+            used_lower = {p.lower() for p in used}
+            _pending_lower.difference_update(used_lower)
+            
+            # Drop other-case duplicates of the used prompts in a single pass
+            prompt_bank[:] = [p for p in prompt_bank if p.lower() not in used_lower]
+            unused = prompt_bank[:]
         
-        if len(unused) == original_count:
-            print(f"Warning: Prompt '{prompt}' not found in unused prompts")
-
-        # Write back to unused_prompts.txt
-        with open(config.UNUSED_PROMPTS_FILE, "w", encoding="utf-8") as f:
-            for p in unused:
-                f.write(p + "\n")
-
-        # Append to used_prompts.txt
-        with open(config.USED_PROMPTS_FILE, "a", encoding="utf-8") as f:
-            f.write(prompt + "\n")
-    except Exception as e:
-        print(f"Error moving prompt to used: {e}")
+        try:
+            with open(config.UNUSED_PROMPTS_FILE, "w", encoding="utf-8") as f:
+                f.writelines(p + "\n" for p in unused)
+            
+            with open(config.USED_PROMPTS_FILE, "a", encoding="utf-8") as f:
+                f.writelines(p + "\n" for p in used)
+        except Exception as e:
+            print(f"Error moving prompts to used: {e}")
+        finally:
+            _read_prompts.cache_clear()
 
 
-def get_random_prompt(prompt_bank):
+def get_random_prompts(prompt_bank, count):
     """
-    Get a random prompt from the bank and mark it as used.
+    Draw distinct random prompts from the bank and mark them as used.
+    
+    Samples indices without replacement instead of shuffling the whole bank.
+    The move to used_prompts.txt is only queued; the next flush_prompts()
+    call writes it.
     
     Args:
-        prompt_bank: List of available prompts
+        prompt_bank: List of available prompts (chosen prompts are removed)
+        count: Number of prompts to draw
     
     Returns:
-        Random prompt string, or None if no prompts available
+        List of `count` prompt strings, padded with a default prompt if the
+        bank runs out
     """
-    if not prompt_bank:
-        print("Warning: No prompts available!")
-        return "Draw something cool"
+    with _lock:
+        k = min(count, len(prompt_bank))
+        if k < count:
+            print("Warning: No prompts available!")
+        
+        # Pop from the highest index down so earlier indices stay valid
+        picks = sorted(random.sample(range(len(prompt_bank)), k), reverse=True)
+        prompts = [prompt_bank.pop(i) for i in picks]
+        for prompt in prompts:
+            _queue_used(prompt)
     
-    prompt = prompt_bank.pop(random.randint(0, len(prompt_bank) - 1))
-    move_prompt_to_used(prompt)
-    return prompt
+    random.shuffle(prompts)
+    return prompts + ["Draw something cool"] * (count - k)
 
-
-# Import at end to avoid circular dependency
-import random
@@ -2,106 +2,191 @@
 Main Flask server for Drawful game.
 Coordinates game logic, socket events, and serves the web interface.
 """
+import config
+
+# Green-thread servers must patch the standard library before anything else
+# (including Flask and our own modules) imports socket or threading
+if config.ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif config.ASYNC_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+import base64
+import binascii
+import errno
+import hashlib
 import logging
-import random
+import os
 import secrets
 import socket as socket_module
+import struct
 import sys
+import threading
 import warnings
 from io import BytesIO
 
-import qrcode
-from flask import Flask, render_template, request, send_file
+from flask import Flask, abort, request, send_file, send_from_directory
 from flask_socketio import SocketIO, emit
+from werkzeug.serving import WSGIRequestHandler
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the stdlib json module
+    orjson = None
 
 # Import our modularized components
-import config
 from game_state import game_state
-from prompt_manager import get_random_prompt, load_prompts
+from prompt_manager import flush_prompts, get_random_prompts, load_prompts
 from timer import Timer
 
 # Suppress socket connection errors from logging
 logging.getLogger("werkzeug").setLevel(logging.ERROR)
 
+
+class OrjsonCodec:
+    """Minimal json-module interface so Socket.IO encodes packets with orjson."""
+    
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
+class NoDelayRequestHandler(WSGIRequestHandler):
+    """
+    Werkzeug request handler that disables Nagle's algorithm per connection.
+    
+    Timer ticks and other Socket.IO frames are tiny; without TCP_NODELAY the
+    kernel may hold them back waiting to coalesce with later data.
+    """
+    
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket_module.IPPROTO_TCP, socket_module.TCP_NODELAY, 1)
+
+
 # Initialize Flask app
 app = Flask(__name__)
-app.config["SECRET_KEY"] = secrets.token_hex(16)
+# Set FLASK_SECRET_KEY to keep sessions valid across server restarts
+app.config["SECRET_KEY"] = os.environ.get("FLASK_SECRET_KEY") or secrets.token_hex(16)
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
-    async_mode="threading",
+    async_mode=config.ASYNC_MODE,
     logger=False,
     engineio_logger=False,
     ping_timeout=config.PING_TIMEOUT,
     ping_interval=config.PING_INTERVAL,
+    json=OrjsonCodec if orjson else None,
 )
 
-# Get local IP for game URL — prefer the active LAN interface IP.
-# Binding uses 0.0.0.0 so we need a routable IP for the QR/printed GAME_URL.
-LOCAL_IP = "127.0.0.1"
-try:
-    # If a HOSTNAME is explicitly configured and resolves to a non-loopback
-    # address, use it. Otherwise fall back to probing the active interface.
+
+def detect_local_ip():
+    """
+    Resolve the LAN IP to advertise in the game URL.
+    
+    Prefers config.HOSTNAME when it resolves to a non-loopback address,
+    otherwise probes the active interface. Called once at module load so
+    request handlers never wait on DNS.
+    
+    Returns:
+        str: Routable local IP, or 127.0.0.1 if none could be found
+    """
     hostname = getattr(config, "HOSTNAME", None)
     if hostname:
         try:
             resolved = socket_module.gethostbyname(hostname)
             if resolved and not resolved.startswith("127."):
-                LOCAL_IP = resolved
-            else:
-                raise Exception("resolved to loopback, use interface probe")
+                return resolved
         except Exception:
-            # Probe active interface by creating a UDP socket to a public IP.
-            try:
-                s = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_DGRAM)
-                s.connect(("8.8.8.8", 80))
-                LOCAL_IP = s.getsockname()[0]
-                s.close()
-            except Exception:
-                LOCAL_IP = "127.0.0.1"
-    else:
+            pass
+    
+    # Connecting a UDP socket sends no packets; it only makes the OS pick
+    # the interface it would route through.
+    try:
         s = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        LOCAL_IP = s.getsockname()[0]
-        s.close()
-except Exception:
-    LOCAL_IP = "127.0.0.1"
+        try:
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except Exception:
+        return "127.0.0.1"
+
 
-GAME_URL = f"https://{LOCAL_IP}:{config.DEFAULT_PORT}"
+# Binding uses 0.0.0.0 so we need a routable IP for the QR/printed GAME_URL.
+# The server only speaks plain HTTP, so the scheme is fixed here rather than
+# sniffed per request; __main__ swaps in the port actually bound.
+LOCAL_IP = detect_local_ip()
+GAME_URL = f"http://{LOCAL_IP}:{config.DEFAULT_PORT}"
 
 # Load prompts
 PROMPT_BANK = load_prompts()
 
+# Socket.IO room every joined player is in. All game broadcasts target it, so
+# sockets that never joined (or were turned away) get none of them; python-
+# socketio drops a socket from its rooms when it disconnects.
+PLAYERS_ROOM = "players"
+# Room of the players who have clicked continue on the current scoreboard
+CONTINUE_ROOM = "continue_ready"
+
+# Serializes storing a drawing with the check for the end of the drawing phase
+drawing_lock = threading.Lock()
+
 # Timer instances
 drawing_timer = None
 guessing_timer = None
 voting_timer = None
 
 
+# Phase byte of the binary timer_tick packet, so one client handler serves every timer
+TIMER_PHASE_DRAWING = 0
+TIMER_PHASE_GUESSING = 1
+TIMER_PHASE_VOTING = 2
+
+
+def emit_timer_tick(phase, time_remaining):
+    """Broadcast a timer tick as 3 bytes: phase (u8) and seconds left (u16, little-endian)."""
+    packet = struct.pack("<BH", phase, max(0, min(time_remaining, 0xFFFF)))
+    socketio.emit("timer_tick", packet, room=PLAYERS_ROOM)
+
+
 def on_drawing_timer_tick(time_remaining):
     """Callback for drawing timer ticks."""
-    socketio.emit("timer_tick", {"time": time_remaining})
+    emit_timer_tick(TIMER_PHASE_DRAWING, time_remaining)
 
 
 def on_drawing_timer_expire():
     """Callback when drawing timer expires."""
-    socketio.emit("timer_expired")
+    socketio.emit("timer_expired", room=PLAYERS_ROOM)
 
 
 def on_guessing_timer_tick(time_remaining):
     """Callback for guessing timer ticks."""
-    socketio.emit("guess_timer_tick", {"time": time_remaining})
+    emit_timer_tick(TIMER_PHASE_GUESSING, time_remaining)
+
+
+def on_voting_timer_tick(time_remaining):
+    """Callback for voting timer ticks."""
+    emit_timer_tick(TIMER_PHASE_VOTING, time_remaining)
 
 
 def on_guessing_timer_expire():
     """Callback when guessing timer expires."""
-    socketio.emit("guess_timer_expired")
+    socketio.emit("guess_timer_expired", room=PLAYERS_ROOM)
 
 
 def start_timer():
     """Start the drawing timer."""
     global drawing_timer
+    stop_timer()
     drawing_timer = Timer(
+        socketio,
         config.DRAWING_TIME,
         on_tick=on_drawing_timer_tick,
         on_expire=on_drawing_timer_expire
@@ -118,7 +203,9 @@ def stop_timer():
 def start_guess_timer():
     """Start the guessing timer."""
     global guessing_timer
+    stop_guess_timer()
     guessing_timer = Timer(
+        socketio,
         config.GUESSING_TIME,
         on_tick=on_guessing_timer_tick,
         on_expire=on_guessing_timer_expire
@@ -135,9 +222,11 @@ def stop_guess_timer():
 def start_vote_timer():
     """Start timer for voting phase."""
     global voting_timer
+    stop_vote_timer()
     voting_timer = Timer(
+        socketio,
         config.VOTING_TIME,
-        on_tick=lambda t: socketio.emit("timer_tick", {"time": t}),
+        on_tick=on_voting_timer_tick,
         on_expire=vote_time_up
     )
     voting_timer.start()
@@ -155,18 +244,103 @@ def vote_time_up():
     current_idx = game_state.current_drawing_index
     
     # Add empty votes for players who haven't voted
-    for pid in game_state.players.keys():
-        if not any(v["player_id"] == pid for v in game_state.votes[current_idx]):
-            game_state.votes[current_idx].append({
-                "player_id": pid,
-                "vote": "",
-                "likes": []
-            })
+    for pid in list(game_state.players):
+        game_state.add_vote(current_idx, pid, "", [])
     
     # Now all votes should be complete
     show_current_scores()
 
 
+def enter_room(sid, room):
+    """Add a session to a room (works outside a request context, e.g. from timers)."""
+    socketio.server.enter_room(sid, room, namespace="/")
+
+
+def players_meta_payload():
+    """Build the players_meta packet clients cache until players_version changes."""
+    return {"version": game_state.players_version, "players": game_state.players_meta()}
+
+
+def broadcast_players_meta():
+    """Send the current players_meta to everyone in the game."""
+    socketio.emit("players_meta", players_meta_payload(), room=PLAYERS_ROOM)
+
+
+def clear_continue_ready():
+    """Forget who has clicked continue and empty the matching room."""
+    game_state.continue_ready.clear()
+    socketio.close_room(CONTINUE_ROOM)
+
+
+def decode_data_url(data_url):
+    """
+    Decode a base64 data URL (as produced by canvas.toDataURL) to bytes.
+    
+    Args:
+        data_url: String like "data:image/png;base64,...."
+    
+    Returns:
+        bytes: Decoded payload, or b"" if the data URL is malformed
+    """
+    _, _, encoded = data_url.partition(",")
+    try:
+        return base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        return b""
+
+
+def drawing_bytes(image):
+    """
+    Get the raw image bytes from a submit_drawing payload.
+    
+    Clients send the canvas PNG as a binary attachment; a base64 data URL
+    string is still accepted from older clients.
+    
+    Args:
+        image: bytes, or a data URL string
+    
+    Returns:
+        bytes: Image payload, or b"" if it is missing or malformed
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, str):
+        return decode_data_url(image)
+    return b""
+
+
+def compact_image(raw):
+    """
+    Shrink a drawing to config.DRAWING_MAX_SIZE and re-encode it as lossless WebP.
+    
+    Args:
+        raw: Image bytes as submitted (PNG)
+    
+    Returns:
+        tuple: (image bytes, mimetype); the original PNG bytes if Pillow is
+        unavailable, can't read the image, or the WebP would be larger
+    """
+    if not raw:
+        return raw, "image/png"
+    
+    try:
+        # Imported lazily so Pillow is only loaded once a drawing comes in
+        from PIL import Image
+
+        img = Image.open(BytesIO(raw))
+        img.thumbnail((config.DRAWING_MAX_SIZE, config.DRAWING_MAX_SIZE))
+        buf = BytesIO()
+        img.save(buf, "WEBP", lossless=True, quality=config.DRAWING_WEBP_EFFORT)
+    except Exception as e:
+        print(f"Could not compact drawing, keeping PNG: {e}")
+        return raw, "image/png"
+    
+    webp = buf.getvalue()
+    if len(webp) >= len(raw):
+        return raw, "image/png"
+    return webp, "image/webp"
+
+
 # Socket event handlers
 
 @socketio.on("join")
@@ -177,39 +351,38 @@ def handle_join(data):
     emoji = data.get("emoji", "😀")
 
     # Check if emoji is already taken by another player
-    for pid, pdata in game_state.players.items():
-        if pid != player_id and pdata.get("emoji") == emoji:
-            emit("emoji_taken", {"message": f"Emoji {emoji} is already taken by {pdata['name']}!"})
-            return
+    owner = game_state.emoji_to_pid.get(emoji)
+    if owner is not None and owner != player_id:
+        emit("emoji_taken", {"message": f"Emoji {emoji} is already taken by {game_state.players[owner]['name']}!"})
+        return
 
     # Check for reconnecting players
-    for pid, pdata in list(game_state.players.items()):
-        if pdata["name"].lower() == name.lower() and pid != player_id:
-            # Check if new emoji is taken by someone else
-            emoji_conflict = False
-            for other_pid, other_pdata in game_state.players.items():
-                if other_pid != pid and other_pid != player_id and other_pdata.get("emoji") == emoji:
-                    emit("emoji_taken", {"message": f"Emoji {emoji} is already taken by {other_pdata['name']}!"})
-                    emoji_conflict = True
-                    break
-            
-            if emoji_conflict:
-                return
-            
-            # Reassign session ID
-            game_state.players[player_id] = pdata
-            # Update emoji if reconnecting with different emoji
-            game_state.players[player_id]["emoji"] = emoji
-            del game_state.players[pid]
-            
-            emit(
-                "joined",
-                {
-                    "player_id": player_id,
-                    "colors": config.PLAYER_COLORS[pdata["color_index"]]
-                }
+    pid = game_state.name_to_pid.get(name.lower())
+    if pid is not None and pid != player_id:
+        # Reassign session ID, updating emoji if reconnecting with a different one
+        pdata = game_state.reassign_player(pid, player_id, emoji)
+        enter_room(player_id, PLAYERS_ROOM)
+        
+        emit(
+            "joined",
+            {
+                "player_id": player_id,
+                "color_index": pdata["color_index"]
+            }
+        )
+        if game_state.phase == "lobby":
+            # The reconnecting client gets the full lobby; everyone else swaps
+            # the old session's entry for the new one (emoji may have changed)
+            emit("update_lobby", {"players": game_state.public_players()})
+            socketio.emit(
+                "update_lobby",
+                {"removed": [pid], "added": {player_id: game_state.public_player(player_id)}},
+                room=PLAYERS_ROOM,
+                skip_sid=player_id
             )
-            return
+        else:
+            broadcast_players_meta()
+        return
 
     # New player
     player_data = game_state.add_player(player_id, name, emoji)
@@ -218,32 +391,47 @@ def handle_join(data):
         emit("game_in_progress")
         return
     
+    enter_room(player_id, PLAYERS_ROOM)
+    
     emit(
         "joined",
         {
             "player_id": player_id,
-            "colors": config.PLAYER_COLORS[player_data["color_index"]]
+            "color_index": player_data["color_index"]
         }
     )
     
-    # Update lobby for all players
-    socketio.emit("update_lobby", {"players": game_state.players})
+    # The new player gets the full lobby, everyone else just the new entry
+    emit("update_lobby", {"players": game_state.public_players()})
+    socketio.emit(
+        "update_lobby",
+        {"added": {player_id: game_state.public_player(player_id)}},
+        room=PLAYERS_ROOM,
+        skip_sid=player_id
+    )
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
     """Handle player disconnection."""
     player_id = request.sid
-    game_state.remove_player(player_id)
+    # Sockets that never joined (turned away mid-game, QR page loads) change
+    # nothing, so neither players_version nor any phase check is affected
+    if not game_state.remove_player(player_id):
+        return
     
     if game_state.phase == "lobby":
-        socketio.emit("update_lobby", {"players": game_state.players})
-    elif game_state.phase == "drawing":
+        socketio.emit("update_lobby", {"removed": [player_id]}, room=PLAYERS_ROOM)
+        return
+    
+    broadcast_players_meta()
+    if game_state.phase == "drawing":
         # Check if all remaining players have submitted
-        if game_state.all_drawings_complete():
-            stop_timer()
-            game_state.current_drawing_index = 0
-            start_guessing_for_current_drawing()
+        with drawing_lock:
+            if game_state.phase == "drawing" and game_state.all_drawings_complete():
+                stop_timer()
+                game_state.select_drawing(0)
+                start_guessing_for_current_drawing()
     elif game_state.phase == "guessing":
         # Check if all remaining players have submitted
         if game_state.all_guesses_complete():
@@ -262,90 +450,100 @@ def handle_start():
     if not game_state.can_start_game():
         return
     
-    game_state.start_new_round()
-    
-    # Assign prompts to players
-    for pid in game_state.players:
-        prompt = get_random_prompt(PROMPT_BANK)
-        game_state.players[pid]["prompt"] = prompt
-    
-    game_state.phase = "drawing"
-    
-    # Notify all players
-    socketio.emit("game_started", {"round": game_state.round - 1})
-    
-    # Send each player their prompt
-    for pid, pdata in game_state.players.items():
-        socketio.emit(
-            "your_turn_draw",
-            {"prompt": pdata["prompt"], "round": game_state.round},
-            room=pid
-        )
-    
-    start_timer()
+    broadcast_players_meta()
+    start_drawing_round()
+
+
+@socketio.on("get_players")
+def handle_get_players():
+    """Send players_meta to a client whose cached copy is out of date."""
+    emit("players_meta", players_meta_payload())
 
 
 @socketio.on("add_time")
 def handle_add_time():
     """Add extra time to drawing timer."""
-    if drawing_timer:
+    if drawing_timer and drawing_timer.active:
+        # The timer's next tick broadcasts the new value; just ack the clicker
         drawing_timer.add_time(30)
+        emit("timer_bumped", {"seconds": 30})
 
 
 @socketio.on("submit_drawing")
 def handle_drawing(data):
     """Handle drawing submission."""
     player_id = request.sid
-    image_data = data.get("image", "")
-    
-    # Check if player already submitted a drawing
-    if any(d["player_id"] == player_id for d in game_state.drawings):
+    # Drop unwanted submits before paying for a background task and re-encode
+    if not can_submit_drawing(player_id):
         return
+    # Decode and store off the handler so concurrent submits don't queue up
+    socketio.start_background_task(process_drawing, player_id, data.get("image"))
+
+
+def can_submit_drawing(player_id):
+    """Check if a session is a player who still owes a drawing this round."""
+    return (
+        game_state.phase == "drawing"
+        and player_id in game_state.players
+        and player_id not in game_state.submitted_drawing_pids
+    )
+
+
+def process_drawing(player_id, image):
+    """
+    Decode, compact and store a submitted drawing, then start guessing once all are in.
     
-    # Store drawing
-    if player_id in game_state.players:
-        prompt = game_state.players[player_id]["prompt"]
-        game_state.drawings.append({
-            "player_id": player_id,
-            "prompt": prompt,
-            "image": image_data
-        })
+    Args:
+        player_id: Session ID of the artist
+        image: Raw submit_drawing image payload
+    """
+    # Cheap checks first so duplicate or stray submits skip the re-encode
+    if not can_submit_drawing(player_id):
+        return
+    image_data, mimetype = compact_image(drawing_bytes(image))
     
-    # Check if all drawings are complete
-    if game_state.all_drawings_complete():
-        stop_timer()
-        game_state.current_drawing_index = 0
-        start_guessing_for_current_drawing()
+    with drawing_lock:
+        # Check again: the phase or the player may have changed while encoding
+        # (e.g. a disconnect ended the phase, or a duplicate submit got in first)
+        if not can_submit_drawing(player_id):
+            return
+        
+        # Store drawing
+        pdata = game_state.players[player_id]
+        game_state.add_drawing(player_id, pdata["prompt"], image_data, mimetype)
+        
+        # Check if all drawings are complete
+        if game_state.all_drawings_complete():
+            stop_timer()
+            game_state.select_drawing(0)
+            start_guessing_for_current_drawing()
 
 
 def start_guessing_for_current_drawing():
     """Start guessing phase for current drawing."""
     game_state.phase = "guessing"
-    current_idx = game_state.current_drawing_index
+    current_idx, artist_id, _, drawing_id = game_state.current_drawing
     
     # Initialize guesses
-    if current_idx not in game_state.guesses:
-        game_state.guesses[current_idx] = []
+    game_state.open_guessing(current_idx)
     
     # Show title card
-    socketio.emit("show_guessing_phase")
+    socketio.emit("show_guessing_phase", room=PLAYERS_ROOM)
     
-    current = game_state.drawings[current_idx]
+    image_url = game_state.drawing_url(current_idx)
     
-    # Send to each player
-    for pid in game_state.players.keys():
-        if pid != current["player_id"]:
-            socketio.emit(
-                "your_turn_guess",
-                {"image": current["image"], "drawing_index": current_idx},
-                room=pid
-            )
-        else:
-            socketio.emit(
-                "wait",
-                {"message": "Waiting for others to guess your drawing..."},
-                room=pid
-            )
+    # Everyone but the artist guesses; one encode for the whole room
+    socketio.emit(
+        "your_turn_guess",
+        {"drawing_id": drawing_id, "image_url": image_url, "drawing_index": current_idx},
+        room=PLAYERS_ROOM,
+        skip_sid=artist_id
+    )
+    socketio.emit(
+        "wait",
+        {"message": "Waiting for others to guess your drawing..."},
+        room=artist_id
+    )
     
     start_guess_timer()
 
@@ -355,30 +553,21 @@ def handle_guess(data):
     """Handle guess submission."""
     player_id = request.sid
     guess = data.get("guess", "").strip()
+    if game_state.current_drawing is None:
+        return
     current_idx = game_state.current_drawing_index
-    current = game_state.drawings[current_idx]
     
-    # Check if guess matches the real prompt (case-insensitive)
-    if guess.lower() == current["prompt"].lower():
-        emit("duplicate_guess", {
-            "message": "That's the real prompt! Try guessing something different."
-        })
+    # Check if guess matches the real prompt or an existing guess (case-insensitive)
+    if game_state.is_guess_taken(current_idx, guess):
+        if guess.lower() == game_state.drawings["prompts_lower"][current_idx]:
+            message = "That's the real prompt! Try guessing something different."
+        else:
+            message = "That prompt has already been submitted! Try something different."
+        emit("duplicate_guess", {"message": message})
         return
     
-    # Check if guess matches any existing guess (case-insensitive)
-    for existing_guess in game_state.guesses[current_idx]:
-        if guess.lower() == existing_guess["guess"].lower():
-            emit("duplicate_guess", {
-                "message": "That prompt has already been submitted! Try something different."
-            })
-            return
-    
     # Add guess (including empty ones)
-    if not any(g["player_id"] == player_id for g in game_state.guesses[current_idx]):
-        game_state.guesses[current_idx].append({
-            "player_id": player_id,
-            "guess": guess  # Can be empty string
-        })
+    game_state.add_guess(current_idx, player_id, guess)
     
     # Check if all guesses complete
     if game_state.all_guesses_complete():
@@ -390,17 +579,19 @@ def handle_guess(data):
 @socketio.on("guess_time_up")
 def handle_guess_time_up():
     """Handle guess timer expiration."""
-    current_idx = game_state.current_drawing_index
-    # Check if current_idx is valid
-    if current_idx >= len(game_state.drawings):
+    # Nothing to do if there is no drawing being guessed
+    if game_state.current_drawing is None:
         return
-    current = game_state.drawings[current_idx]
+    current_idx = game_state.current_drawing_index
     # Find all players who have not guessed (excluding artist)
-    guessed_pids = {g["player_id"] for g in game_state.guesses[current_idx]}
-    missing = [pid for pid in game_state.players if pid != current["player_id"] and pid not in guessed_pids]
+    guessed = game_state.guessed_by.get(current_idx, set())
+    missing = [
+        pid for pid in game_state.eligible_guessers(current_idx)
+        if game_state.players[pid]["player_index"] not in guessed
+    ]
     # Auto-submit empty guesses for missing players
     for pid in missing:
-        game_state.guesses[current_idx].append({"player_id": pid, "guess": ""})
+        game_state.add_guess(current_idx, pid, "")
     stop_guess_timer()
     start_voting_for_current_drawing()
 
@@ -415,51 +606,16 @@ def start_voting_for_current_drawing():
         game_state.votes[current_idx] = []
     
     # Show title card
-    socketio.emit("show_voting_phase")
-    
-    current = game_state.drawings[current_idx]
-    guesses = game_state.guesses[current_idx]
-    
-    # Send voting options to each player
-    for pid in game_state.players.keys():
-        if pid != current["player_id"]:
-            # Create options (guesses + real prompt, excluding this player's guess)
-            options = [{"text": current["prompt"], "player_id": current["player_id"], "is_correct": True}]
-            for g in guesses:
-                if g["player_id"] != pid and g["guess"].strip():  # Filter out empty guesses
-                    options.append({"text": g["guess"], "player_id": g["player_id"], "is_correct": False})
-            
-            random.shuffle(options)
-            
-            socketio.emit(
-                "your_turn_vote",
-                {
-                    "image": current["image"],
-                    "options": options,
-                    "artist_id": current["player_id"],
-                    "players": game_state.players
-                },
-                room=pid
-            )
-        else:
-            # Artist gets voting screen too, but with all options (to like)
-            options = [{"text": current["prompt"], "player_id": current["player_id"], "is_correct": True}]
-            for g in guesses:
-                if g["guess"].strip():  # Filter out empty guesses
-                    options.append({"text": g["guess"], "player_id": g["player_id"], "is_correct": False})
-            
-            random.shuffle(options)
-            
-            socketio.emit(
-                "your_turn_vote",
-                {
-                    "image": current["image"],
-                    "options": options,
-                    "artist_id": current["player_id"],
-                    "players": game_state.players
-                },
-                room=pid
-            )
+    socketio.emit("show_voting_phase", room=PLAYERS_ROOM)
+    
+    # Every player gets the same payload, encoded once: voters hide their
+    # own guess client-side, the artist sees every option (to like)
+    payload = game_state.get_vote_payload(current_idx)
+    socketio.emit(
+        "your_turn_vote",
+        {**payload, "players_version": game_state.players_version},
+        room=PLAYERS_ROOM
+    )
     
     # Start the voting timer
     start_vote_timer()
@@ -474,12 +630,7 @@ def handle_vote(data):
     current_idx = game_state.current_drawing_index
     
     # Add vote (including empty ones to prevent hang)
-    if not any(v["player_id"] == player_id for v in game_state.votes[current_idx]):
-        game_state.votes[current_idx].append({
-            "player_id": player_id,
-            "vote": vote,  # Can be empty string
-            "likes": likes
-        })
+    game_state.add_vote(current_idx, player_id, vote, likes)
     
     # Check if all votes complete
     if game_state.all_votes_complete():
@@ -495,12 +646,7 @@ def handle_likes_only(data):
     current_idx = game_state.current_drawing_index
     
     # Add likes without vote (for artist)
-    if not any(v["player_id"] == player_id for v in game_state.votes[current_idx]):
-        game_state.votes[current_idx].append({
-            "player_id": player_id,
-            "vote": None,  # No vote for artist
-            "likes": likes
-        })
+    game_state.add_vote(current_idx, player_id, None, likes)
     
     # Check if all votes complete
     if game_state.all_votes_complete():
@@ -510,7 +656,7 @@ def handle_likes_only(data):
 
 def show_current_scores():
     """Calculate and show scores for current drawing."""
-    current_idx = game_state.current_drawing_index
+    current_idx, artist_id, _, _ = game_state.current_drawing
     
     # Calculate scores
     result = game_state.calculate_scores_for_drawing(current_idx)
@@ -518,13 +664,15 @@ def show_current_scores():
     if result:
         socketio.emit("show_current_scores", {
             "correct_answer": result["correct_answer"],
-            "artist_id": game_state.drawings[current_idx]["player_id"],
-            "drawing_image": result["drawing_image"],
-            "scores": {pid: pdata["score"] for pid, pdata in game_state.players.items()},
-            "players": game_state.players,
-            "guesses": game_state.guesses[current_idx],
-            "votes": game_state.votes[current_idx]
-        })
+            "artist_id": artist_id,
+            "drawing_url": game_state.drawing_url(current_idx),
+            "scores": game_state.scores(),
+            "score_delta": result["score_delta"],
+            "likes_delta": result["likes_delta"],
+            "players_version": game_state.players_version,
+            "guesses": game_state.guesses_for_client(current_idx),
+            "votes": game_state.votes_for_client(current_idx)
+        }, room=PLAYERS_ROOM)
 
 
 @socketio.on("continue_to_next")
@@ -532,6 +680,7 @@ def handle_continue():
     """Handle continue button click."""
     player_id = request.sid
     game_state.continue_ready.add(player_id)
+    enter_room(player_id, CONTINUE_ROOM)
     
     # Calculate waiting count
     ready_count = len(game_state.continue_ready)
@@ -540,16 +689,14 @@ def handle_continue():
     
     # Broadcast updated waiting count to all players who are already waiting (including this one)
     if waiting_count > 0:
-        for ready_pid in game_state.continue_ready:
-            socketio.emit("wait", {
-                "message": f"Waiting for {waiting_count} player{'s' if waiting_count != 1 else ''} to continue..."
-            }, room=ready_pid)
+        socketio.emit("wait", {
+            "message": f"Waiting for {waiting_count} player{'s' if waiting_count != 1 else ''} to continue..."
+        }, room=CONTINUE_ROOM)
     
     if game_state.all_players_ready_to_continue():
-        game_state.continue_ready.clear()
-        game_state.current_drawing_index += 1
+        clear_continue_ready()
         
-        if game_state.current_drawing_index < len(game_state.drawings):
+        if game_state.advance_drawing():
             # More drawings in this round
             start_guessing_for_current_drawing()
         else:
@@ -564,23 +711,26 @@ def handle_continue():
 
 def handle_next_round():
     """Start the next round."""
+    start_drawing_round()
+
+
+def start_drawing_round():
+    """Deal prompts and start the drawing phase of a new round."""
     game_state.start_new_round()
     
-    # Assign prompts
-    for pid in game_state.players:
-        prompt = get_random_prompt(PROMPT_BANK)
+    # Assign prompts to players
+    player_ids = game_state.player_ids()
+    prompts = get_random_prompts(PROMPT_BANK, len(player_ids))
+    for pid, prompt in zip(player_ids, prompts):
         game_state.players[pid]["prompt"] = prompt
     
     game_state.phase = "drawing"
     
-    socketio.emit("game_started", {"round": game_state.round - 1})
-    
-    for pid, pdata in game_state.players.items():
-        socketio.emit(
-            "your_turn_draw",
-            {"prompt": pdata["prompt"], "round": game_state.round},
-            room=pid
-        )
+    # The (0-based) round is common to everyone, so it is broadcast once;
+    # each player then only gets their own prompt
+    socketio.emit("game_started", {"round": game_state.round - 1}, room=PLAYERS_ROOM)
+    for pid, prompt in zip(player_ids, prompts):
+        socketio.emit("your_turn_draw", {"prompt": prompt}, room=pid)
     
     start_timer()
 
@@ -593,63 +743,120 @@ def show_final_scores():
     likes = {pid: pdata["likes"] for pid, pdata in game_state.players.items()}
     
     socketio.emit("show_final", {
-        "scores": {pid: pdata["score"] for pid, pdata in game_state.players.items()},
+        "scores": game_state.scores(),
         "likes": likes,
-        "players": game_state.players
-    })
+        "players_version": game_state.players_version
+    }, room=PLAYERS_ROOM)
 
 
 @socketio.on("play_again")
 def handle_play_again():
     """Reset game for another round."""
-    for pid in game_state.players.keys():
-        game_state.players[pid]["score"] = 0
-        game_state.players[pid]["likes"] = 0
+    game_state.reset_scores()
     
     game_state.phase = "lobby"
-    game_state.drawings = []
-    game_state.guesses = {}
-    game_state.votes = {}
+    game_state.clear_drawings()
     game_state.round = 0
     game_state.current_drawing_index = 0
     game_state.current_drawer_index = 0
     game_state.player_order = []
-    game_state.continue_ready.clear()
+    clear_continue_ready()
     
-    socketio.emit("reset")
-    socketio.emit("update_lobby", {"players": game_state.players})
+    socketio.emit("reset", room=PLAYERS_ROOM)
+    socketio.emit("update_lobby", {"players": game_state.public_players()}, room=PLAYERS_ROOM)
+
+
+@app.route("/drawing/<drawing_id>")
+def drawing(drawing_id):
+    """Serve a submitted drawing; IDs are never reused, so it is cacheable."""
+    stored = game_state.drawing_store.get(drawing_id)
+    if stored is None:
+        abort(404)
+    
+    image, mimetype = stored
+    response = send_file(BytesIO(image), mimetype=mimetype, etag=drawing_id)
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    return response
+
+
+# Rendered QR code for GAME_URL, built once
+QR_PNG = None  # (png bytes, etag)
+_qr_pending = False
+_qr_failed = False  # Set once rendering has failed, so /qr_code stops retrying
+
+
+def render_qr_png():
+    """Render the QR code for GAME_URL and store the PNG bytes (and ETag) in QR_PNG."""
+    global QR_PNG, _qr_pending, _qr_failed
+    try:
+        # Imported lazily so Pillow is only loaded once a QR code is needed
+        import qrcode
+
+        qr = qrcode.QRCode(box_size=10, border=2)
+        qr.add_data(GAME_URL)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="black", back_color="white")
+        
+        buf = BytesIO()
+        img.save(buf, "PNG")
+        png = buf.getvalue()
+        QR_PNG = (png, hashlib.sha1(png).hexdigest())
+    except Exception as e:
+        print(f"Could not render QR code: {e}")
+        _qr_failed = True
+    finally:
+        _qr_pending = False
+
+
+def persist_prompts_loop():
+    """Write queued used prompts to disk periodically, off the handler path."""
+    while True:
+        socketio.sleep(config.PROMPT_FLUSH_INTERVAL)
+        flush_prompts(PROMPT_BANK)
 
 
 @app.route("/qr_code")
 def qr_code():
-    """Generate QR code for the game URL."""
-    # Use the same protocol as the current request to avoid iOS compatibility issues
-    protocol = "https" if request.is_secure else "http"
-    qr_url = f"{protocol}://{LOCAL_IP}:{config.DEFAULT_PORT}"
-    
-    qr = qrcode.QRCode(box_size=10, border=2)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    buf = BytesIO()
-    img.save(buf, "PNG")
-    buf.seek(0)
-    
-    return send_file(buf, mimetype="image/png")
+    """Serve the QR code for the game URL."""
+    global _qr_pending
+    if QR_PNG is None:
+        if _qr_failed:
+            return "", 500
+        # Render off the request handler; the client retries shortly
+        if not _qr_pending:
+            _qr_pending = True
+            socketio.start_background_task(render_qr_png)
+        return "", 503, {"Retry-After": "1"}
+    
+    # The QR code encodes LOCAL_IP, not the origin the browser used (often
+    # localhost), so it can change between restarts; revalidate every time
+    # and let the ETag turn the repeat requests into cheap 304s
+    png, etag = QR_PNG
+    response = send_file(BytesIO(png), mimetype="image/png", etag=etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # Ensure the configured port is available; if not, pick the next free port.
+# SO_REUSEPORT is deliberately not set: it would let a second server share
+# the port and split the players between two games.
 def find_available_port(start_port, max_tries=50):
-    for p in range(start_port, start_port + max_tries):
-        try:
-            test_sock = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_STREAM)
-            test_sock.setsockopt(socket_module.SOL_SOCKET, socket_module.SO_REUSEADDR, 1)
-            test_sock.bind(("", p))
-            test_sock.close()
-            return p
-        except OSError:
-            continue
-    return start_port
+    # One socket is reused for every probe; a failed bind leaves it unbound
+    test_sock = socket_module.socket(socket_module.AF_INET, socket_module.SOCK_STREAM)
+    try:
+        test_sock.setsockopt(socket_module.SOL_SOCKET, socket_module.SO_REUSEADDR, 1)
+        for p in range(start_port, start_port + max_tries):
+            try:
+                test_sock.bind(("", p))
+                return p
+            except OSError as e:
+                # Anything but "in use" (e.g. permission denied) is a real error
+                if e.errno != errno.EADDRINUSE:
+                    raise
+        # Every nearby port is taken; let the kernel pick a free one
+        test_sock.bind(("", 0))
+        return test_sock.getsockname()[1]
+    finally:
+        test_sock.close()
 
 
 
@@ -657,8 +864,8 @@ def find_available_port(start_port, max_tries=50):
 
 @app.route("/")
 def index():
-    """Serve the main game page."""
-    return render_template("index.html")
+    """Serve the main game page as a static file (no template rendering)."""
+    return send_from_directory(app.static_folder, "index.html", max_age=300)
 
 
 if __name__ == "__main__":
@@ -683,16 +890,26 @@ if __name__ == "__main__":
     print(f"  Number of Rounds: {config.NUM_ROUNDS}")
     print(f"  Min Players: {config.MIN_PLAYERS}")
     print(f"  Max Players: {config.MAX_PLAYERS}")
+    print(f"  Async Mode: {config.ASYNC_MODE}")
     print("\nServer starting on:")
 
     port_to_use = find_available_port(config.DEFAULT_PORT)
     # Update GAME_URL to include the actual port we will bind to.
-    GAME_URL = f"https://{LOCAL_IP}:{port_to_use}"
+    GAME_URL = f"http://{LOCAL_IP}:{port_to_use}"
+
+    # Pre-render the QR code so requests never block on it
+    socketio.start_background_task(render_qr_png)
+    socketio.start_background_task(persist_prompts_loop)
 
     print(f"  Local:   http://localhost:{port_to_use}")
     print(f"  Network: {GAME_URL}")
     print("\nShare the Network address with players on your WiFi!")
     print("=" * 50 + "\n")
+    # Only Werkzeug (threading mode) takes a request handler; eventlet and
+    # gevent already set TCP_NODELAY on the sockets they accept
+    server_options = {}
+    if config.ASYNC_MODE == "threading":
+        server_options["request_handler"] = NoDelayRequestHandler
     try:
         socketio.run(
             app,
@@ -701,7 +918,11 @@ if __name__ == "__main__":
             debug=False,
             allow_unsafe_werkzeug=True,
             use_reloader=False,
+            **server_options,
         )
     except OSError as e:
         print(f"Failed to start server: {e}")
         sys.exit(1)
+    finally:
+        # Don't lose prompts drawn since the last background flush
+        flush_prompts(PROMPT_BANK)
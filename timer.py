@@ -1,56 +1,85 @@
 """
 Timer management for game phases.
 """
-import threading
+import math
 import time
-import config
 
 
 class Timer:
     """Manages a countdown timer for game phases."""
     
-    def __init__(self, duration, on_tick=None, on_expire=None):
+    def __init__(self, socketio, duration, on_tick=None, on_expire=None):
         """
         Initialize a timer.
         
         Args:
+            socketio: SocketIO instance used to run the countdown task
             duration: Timer duration in seconds
             on_tick: Callback function called each second with time_remaining
             on_expire: Callback function called when timer expires
         """
+        self.socketio = socketio
         self.duration = duration
-        self.time_remaining = duration
+        self.deadline = None  # time.monotonic() value at which the timer expires
         self.active = False
-        self.thread = None
         self.on_tick = on_tick
         self.on_expire = on_expire
+        self._cancel = None  # Event of the current run; set by stop() to wake the countdown
+    
+    @property
+    def time_remaining(self):
+        """Whole seconds left, rounded up."""
+        if self.deadline is None:
+            return self.duration
+        return max(0, math.ceil(self.deadline - time.monotonic()))
     
     def start(self):
-        """Start the timer."""
-        self.time_remaining = self.duration
+        """Start the timer, cancelling any countdown still running."""
+        # Callers replace the Timer on every (re)start and stop the old one
+        # first; stopping here also covers restarting the same instance
+        self.stop()
+        # Created through the async server so it is green under eventlet/gevent
+        self._cancel = self.socketio.server.eio.create_event()
+        self.deadline = time.monotonic() + self.duration
         self.active = True
-        if self.thread is None or not self.thread.is_alive():
-            self.thread = threading.Thread(target=self._countdown, daemon=True)
-            self.thread.start()
+        self.socketio.start_background_task(self._countdown, self._cancel)
     
     def stop(self):
-        """Stop the timer."""
+        """Stop the timer; the countdown wakes and exits without ticking or expiring."""
         self.active = False
+        if self._cancel is not None:
+            self._cancel.set()
     
     def add_time(self, seconds):
         """Add additional time to the timer."""
         if self.active:
-            self.time_remaining += seconds
+            self.deadline += seconds
     
-    def _countdown(self):
-        """Internal countdown loop."""
-        while self.active and self.time_remaining > 0:
+    def _countdown(self, cancel):
+        """
+        Internal countdown loop.
+        
+        Ticks are scheduled against the monotonic clock and the remaining
+        time is derived from the deadline, so slow callbacks don't make the
+        timer drift. Waiting on the run's cancel event instead of sleeping
+        lets stop() end the loop at once rather than up to a second later.
+        
+        Args:
+            cancel: Event that stop() (or a restart) sets for this run
+        """
+        next_tick = time.monotonic()
+        while not cancel.is_set():
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                break
             if self.on_tick:
-                self.on_tick(self.time_remaining)
-            time.sleep(1)
-            self.time_remaining -= 1
+                self.on_tick(math.ceil(remaining))
+            next_tick += 1.0
+            if cancel.wait(max(0, next_tick - time.monotonic())):
+                return
         
-        if self.active and self.time_remaining <= 0:
+        if not cancel.is_set():
             self.active = False
+            cancel.set()
             if self.on_expire:
                 self.on_expire()